@@ -1,4 +1,4 @@
-from fsm import FSM, FSMThreaded
+from fsm import FSM, FSMThreaded, pureConst
 import inspect
 import timeit
 
@@ -45,7 +45,8 @@ FSM1 = \
 ]
         
 class myStateMachine(FSMThreaded):
-    
+    __slots__ = ('eventRoutine',)
+
     def __init__(self, threaded = False):
         if threaded:
             FSMThreaded.__init__(self, FSM1) 
@@ -54,44 +55,46 @@ class myStateMachine(FSMThreaded):
             FSM.__init__(self, FSM1) 
             self.eventRoutine = getattr(self, 'OnEvent')
     
+    @pureConst
     def condTrue(self):
         retVal = True
-        if __debug__: self.dbgPrint('"%s" returning %s - called from "%s"' % (whoami(), retVal, whosMyCaller()))
+        if self._debug: self.dbgPrint('"%s" returning %s - called from "%s"' % (whoami(), retVal, whosMyCaller()))
         return retVal
     
+    @pureConst
     def condFalse(self):
         retVal = False
-        if __debug__: self.dbgPrint('"%s" returning %s - called from "%s"' % (whoami(), retVal, whosMyCaller()))
+        if self._debug: self.dbgPrint('"%s" returning %s - called from "%s"' % (whoami(), retVal, whosMyCaller()))
         return retVal
     
     def actionTrue(self):
         retVal = True
-        if __debug__: self.dbgPrint('"%s" returning %s - called from "%s"' % (whoami(), retVal, whosMyCaller()))
+        if self._debug: self.dbgPrint('"%s" returning %s - called from "%s"' % (whoami(), retVal, whosMyCaller()))
         return retVal
     
     def actionFalse(self):
         retVal = False
-        if __debug__: self.dbgPrint('"%s" returning %s - called from "%s"' % (whoami(), retVal, whosMyCaller()))
+        if self._debug: self.dbgPrint('"%s" returning %s - called from "%s"' % (whoami(), retVal, whosMyCaller()))
         return retVal
     
     def EntryAction0(self):
         retVal = True
-        if __debug__: self.dbgPrint('"%s" returning %s - called from "%s"' % (whoami(), retVal, whosMyCaller()))
+        if self._debug: self.dbgPrint('"%s" returning %s - called from "%s"' % (whoami(), retVal, whosMyCaller()))
         return retVal
     
     def EntryAction1(self):
         retVal = True
-        if __debug__: self.dbgPrint('"%s" returning %s - called from "%s"' % (whoami(), retVal, whosMyCaller()))
+        if self._debug: self.dbgPrint('"%s" returning %s - called from "%s"' % (whoami(), retVal, whosMyCaller()))
         return retVal
     
     def ExitAction0(self):
         retVal = True
-        if __debug__: self.dbgPrint('"%s" returning %s - called from "%s"' % (whoami(), retVal, whosMyCaller()))
+        if self._debug: self.dbgPrint('"%s" returning %s - called from "%s"' % (whoami(), retVal, whosMyCaller()))
         return retVal
     
     def ExitAction1(self):
         retVal = True
-        if __debug__: self.dbgPrint('"%s" returning %s - called from "%s"' % (whoami(), retVal, whosMyCaller()))
+        if self._debug: self.dbgPrint('"%s" returning %s - called from "%s"' % (whoami(), retVal, whosMyCaller()))
         return retVal
     
     def Test(self):
@@ -105,7 +108,7 @@ class myStateMachine(FSMThreaded):
         self.eventRoutine('EVENT_EXIT')
         
     def Test1(self):
-        for i in xrange(100):
+        for i in range(100):
             self.eventRoutine('EVENT1')
             self.eventRoutine('EVENT3')
             self.eventRoutine('EVENT1')
@@ -132,17 +135,17 @@ b.Test1()
 """
     try:
         a = myStateMachine(False)
-    except ValueError, s:
-        print 'ValueError %s' % s
-    except AttributeError, s:
-        print 'AttributeError %s' % s
+    except ValueError as s:
+        print('ValueError %s' % s)
+    except AttributeError as s:
+        print('AttributeError %s' % s)
     else:
         MyTimer = timeit.Timer(stmt, setup)
         iters = 10000
         myTime = MyTimer.timeit(iters)
         trans = 10 * iters
-        print "%d transitions in %f seconds %f sec/trans %f trans/sec" % (trans, myTime, myTime/trans, trans/myTime)
+        print("%d transitions in %f seconds %f sec/trans %f trans/sec" % (trans, myTime, myTime/trans, trans/myTime))
         
-        print a.currentStateName
+        print(a.currentStateName)
     z = 1
 
@@ -1,80 +1,168 @@
-from UserList import UserList
-from Queue import Queue
-from threading import Thread, _Timer
-from time import *
+from sys import intern
+from threading import Thread, Semaphore, Timer, Event
+from time import monotonic
+
+## numba/numpy are optional; they back the batch runEvents fast path only
+try:
+    import numpy
+    from numba import njit
+except ImportError:
+    numpy = None
+    njit = None
 
 ## these are special tokens for the FSM
-_token_STATE_SAME = 'STATE_SAME'
-_token_STATE_ANY = 'STATE_ANY'
-_token_EVENT_CATCH = 'EVENT_CATCH'
+## interned, like all state and event names, so the dict lookups and
+## comparisons they appear in are satisfied by pointer equality
+_token_STATE_SAME = intern('STATE_SAME')
+_token_STATE_ANY = intern('STATE_ANY')
+_token_EVENT_CATCH = intern('EVENT_CATCH')
 ## to exit an instance of FSMThread
-_token_EVENT_EXIT = 'EVENT_EXIT'
+_token_EVENT_EXIT = intern('EVENT_EXIT')
 
-debug = True
+## event-id sentinels carried through the threaded event ring; real event
+## ids are always >= 0
+_EXIT_EVENT_ID = -1
+_UNKNOWN_EVENT_ID = -2
 
-class Enumerate(object):
-    def __init__(self, names):
-        for number, name in enumerate(names):
-            setattr(self, name, number)
-            
-            
-class MethodList(UserList):
-    """ Convert a list of strings that represent methods to a
-        list of the actual methods for the class that object is
+## module-wide default for FSM debug tracing, sampled per instance at
+## construction time; set fsm.debug = True (or instance._debug) to trace
+debug = False
+
+def pureConst(method):
+    """ Mark a condition method as side-effect free with a return value that
+        is constant for the lifetime of the FSM. Condition lists made up
+        entirely of pureConst methods are evaluated once at parse time and
+        folded to a plain bool in the transition tables
     """
-    def __init__(self, object,  methodNameList):
-        UserList.__init__(self)
-        
-        # if the description had None for a list, return an empty list
-        if not methodNameList:
-            return;
-        for methodName in methodNameList:
-            try:
-                method = getattr(object, methodName)
-            except AttributeError:
-                raise ValueError, 'action "%s" not found' % methodName
-            else:
-                if not callable(method):
-                    raise AttributeError, 'action "%s" not callable' % methodName
-                self.append(method)
-            
-class FSMTimer(_Timer):
+    method._fsmPureConst = True
+    return method
+
+def makeMethodList(object, methodNameList, available=None):
+    """ Convert a list of strings that represent methods to a
+        tuple of the actual methods for the class that object is.
+        available is a prebuilt set of object's attribute names; passing
+        one in avoids recomputing dir(object) for every list parsed
+    """
+    # if the description had None for a list, return an empty tuple
+    if not methodNameList:
+        return ()
+    if available is None:
+        available = set(dir(object))
+    for methodName in methodNameList:
+        # membership in the dir() set replaces a try/except per getattr
+        if methodName not in available:
+            raise ValueError('action "%s" not found' % methodName)
+    methods = tuple([getattr(object, methodName) for methodName in methodNameList])
+    for methodName, method in zip(methodNameList, methods):
+        if not callable(method):
+            raise AttributeError('action "%s" not callable' % methodName)
+    return methods
+
+if njit is not None:
+    @njit(cache=True)
+    def _runEventsKernel(eventIds, state, nextState, actionStart, actionCount, actionIds, actionsOut):
+        """ Advance the typed FSM over a batch of event ids, recording the
+            ids of the actions to invoke; the caller drains them in Python
+        """
+        outCount = 0
+        for i in range(eventIds.shape[0]):
+            event = eventIds[i]
+            start = actionStart[state, event]
+            for j in range(actionCount[state, event]):
+                actionsOut[outCount] = actionIds[start + j]
+                outCount += 1
+            target = nextState[state, event]
+            if target >= 0:
+                state = target
+        return state, outCount
+else:
+    _runEventsKernel = None
+
+class FSMTimer(Timer):
     def __init__(self, interval, function, args=[], kwargs={}):
-#        Thread.__init__(self, target=self._CustomTimerThread, args=[function, args], kwargs=kwargs)
-        _Timer.__init__(self, interval, function, args, kwargs)
+        Timer.__init__(self, interval, function, args, kwargs)
+        # remaining run time while paused or not yet started
         self.timeLeft = interval
         self.paused = False
-        
+        self._deadline = None
+        # pulsed by Pause/Resume/cancel to wake the timer thread
+        self._stateChanged = Event()
+
     def run(self):
-        while True:
-            self.finished.wait(1)
-            if not self.finished.isSet():
-                if not self.paused:
-                    self.timeLeft = self.timeLeft - 1
-                    if self.timeLeft <= 0:
-                        self.function(*self.args, **self.kwargs)
-                        break
+        # sleep until the absolute deadline instead of polling every second:
+        # one kernel wait per timer, plus one per Pause/Resume cycle
+        self._deadline = monotonic() + self.timeLeft
+        while not self.finished.is_set():
+            if self.paused:
+                self._stateChanged.wait()
+                self._stateChanged.clear()
+                continue
+            remaining = self._deadline - monotonic()
+            if remaining <= 0:
+                self.function(*self.args, **self.kwargs)
+                break
+            self.finished.wait(remaining)
         self.finished.set()
-        
-        
+
+    def cancel(self):
+        Timer.cancel(self)
+        # a paused timer is blocked on _stateChanged, wake it so it exits
+        self._stateChanged.set()
+
     def Pause(self):
-        self.paused = True
-        
+        if not self.paused:
+            if self._deadline is not None:
+                self.timeLeft = max(self._deadline - monotonic(), 0)
+            self.paused = True
+
     def Resume(self):
-        self.paused = False
-        
+        if self.paused:
+            self._deadline = monotonic() + self.timeLeft
+            self.paused = False
+            self._stateChanged.set()
+
     def TimeRemaining(self):
-        return self.timeLeft
+        if self.paused or self._deadline is None:
+            return self.timeLeft
+        return max(self._deadline - monotonic(), 0)
 
 class FSM(object):
+    ## fixed attribute layout: saves the per-instance dict and one dict
+    ## lookup on every attribute access in the dispatch path
+    __slots__ = ('_debug', 'memoizeDispatch', 'specializeDispatch', 'dbgLabel',
+                 'stateDict', 'initialStateName', 'stateNames', 'stateIndex',
+                 'eventNames', 'eventIndex', 'entryActions', 'exitActions',
+                 'catchTrans', 'flatTrans', 'transByState', 'currentState',
+                 '_curTrans', '_onEventId', '_dispatchCache', '_typed',
+                 '_availableMethods')
+
     def __init__(self, FSMDescription):
-        self.ParseFSMDescription(FSMDescription)
-        self.currentStateName = self.initialStateName
+        self._debug = debug
+        # opt-in: remember which transition fired for a (state, event) pair
+        # and skip condition evaluation the next time the pair is seen.
+        # only enable this when every condition method is pure
+        self.memoizeDispatch = False
+        # generate a dispatcher specialized to this description at Start()
+        # time; the interpretive OnEvent remains the fallback and is always
+        # used when debug tracing is on
+        self.specializeDispatch = True
+        # set before parsing: pureConst conditions run (and may trace)
+        # while the description is parsed
         self.dbgLabel = 'FSM'
-        
+        self.ParseFSMDescription(FSMDescription)
+        self.currentState = self.stateIndex[self.initialStateName]
+        self._curTrans = self.transByState[self.currentState]
+        # the active dispatcher; _generateDispatcher may replace it with a
+        # specialized function
+        self._onEventId = self.OnEventId
+
     def dbgPrint(self, string):
-        print "%s - %s" % (self.dbgLabel, string)
-    
+        print("%s - %s" % (self.dbgLabel, string))
+
+    @property
+    def currentStateName(self):
+        return self.stateNames[self.currentState]
+
     def GetCurrentState(self):
         return self.currentStateName
 
@@ -83,51 +171,140 @@ class FSM(object):
             and return a list that the FSM will use for processing.
         """
         
-        eFSM =  Enumerate(('initialState', 'stateList'))
-        eState =  Enumerate(('name', 'entryActions', 'exitActions', 'transitions'))
+        initialStateName, stateList = description
+        # built once; makeMethodList validates every name against it
+        self._availableMethods = set(dir(self))
         self.stateDict = {}
-        
+
         # scan through list and get all state names and create an empty
         # dictionary entry for them, this allows 'nextState' to be verified
         # during the parsing of transitions (forward references are checked'
         # also check for duplicate stateNames
-        for state in description[eFSM.stateList]:
-            stateName = state[eState.name]
+        for state in stateList:
+            stateName = state[0]
             if stateName in self.stateDict:
-                raise ValueError, 'Duplicate State Name "%s"' % stateName
-            
+                raise ValueError('Duplicate State Name "%s"' % stateName)
+
             # add the name to the dictionary
             self.stateDict[stateName] = None
-            
+
         # validate initialstate
-        self.initialStateName = description[eFSM.initialState]
+        self.initialStateName = initialStateName
         if self.initialStateName not in self.stateDict:
-            raise ValueError, 'Initial State "%s" not Found' % self.initialStateName
-        
-            
+            raise ValueError('Initial State "%s" not Found' % self.initialStateName)
+
+
         # parse the list of states and hand on to the generated
         # parsed description that the FSM will actually act on
-        self.stateDict = dict([self.parseState(state) for state in description[eFSM.stateList]])
-        
-          
-            
+        parsedStates = [self.parseState(state) for state in stateList]
+        self.stateDict = dict(parsedStates)
+
+        # assign a small integer to every state so the runtime tables can be
+        # indexed instead of keyed by name
+        self.stateNames = [name for (name, value) in parsedStates]
+        self.stateIndex = dict([(name, i) for i, name in enumerate(self.stateNames)])
+
+        # any previously memoized outcomes refer to the old tables
+        self._dispatchCache = {}
+        # typed tables for runEvents are rebuilt lazily
+        self._typed = None
+
+        self.buildTransitionTables()
+
+        # intern every event to a small integer so dispatch indexes lists
+        # instead of hashing names; OnEvent maps name to id once on entry
+        self.eventNames = sorted(set([event for (index, event) in self.flatTrans]))
+        self.eventIndex = dict([(name, i) for i, name in enumerate(self.eventNames)])
+
+        # regroup the flat table per state so the current state's event table
+        # can be cached across calls and swapped only on a transition; the
+        # rows are lists indexed by event id with None for unhandled
+        self.transByState = [[None] * len(self.eventNames) for name in self.stateNames]
+        for (index, event), transitionList in self.flatTrans.items():
+            self.transByState[index][self.eventIndex[event]] = transitionList
+
+
+    def buildTransitionTables(self):
+        """ Flatten the parsed description into the tables OnEvent dispatches on.
+            For every (state, event) pair the state's own transitions and the
+            STATE_ANY transitions are merged once, here, so the hot path never
+            builds or extends a list. Each transition is frozen as the tuple
+            (conditions, nextState, transitionActions, stateChangeActions,
+             sameState) with states as integers; stateChangeActions is the
+             source state's exit actions and the target's entry actions
+             pre-concatenated so a state change runs one fused list.
+        """
+        anyState = self.stateDict.get(_token_STATE_ANY)
+        anyTransitionDict = anyState[3] if anyState is not None else {}
+
+        self.entryActions = []
+        self.exitActions = []
+        for name in self.stateNames:
+            stateName, entryActions, exitActions, transitionDict = self.stateDict[name]
+            self.entryActions.append(tuple(entryActions))
+            self.exitActions.append(tuple(exitActions))
+
+        self.catchTrans = []
+        self.flatTrans = {}
+        for index, name in enumerate(self.stateNames):
+            transitionDict = self.stateDict[name][3]
+
+            # the catch transition, if any, is per state
+            catchList = transitionDict.get(_token_EVENT_CATCH)
+            if catchList:
+                self.catchTrans.append(self.flattenTransition(index, catchList[0]))
+            else:
+                self.catchTrans.append(None)
+
+            # merge the state's transitions with STATE_ANY's, state's first
+            events = set(transitionDict)
+            if name != _token_STATE_ANY:
+                events.update(anyTransitionDict)
+            for event in events:
+                merged = list(transitionDict.get(event, []))
+                if name != _token_STATE_ANY:
+                    merged.extend(anyTransitionDict.get(event, []))
+                self.flatTrans[(index, event)] = tuple(
+                    [self.flattenTransition(index, transition) for transition in merged])
+
+
+    def flattenTransition(self, fromIndex, transition):
+        """ Freeze one parsed transition into the flat runtime tuple,
+            resolving the next state to an integer and pulling in the exit
+            actions of the source state and entry actions of the target
+        """
+        conditionActions, nextStateName, transitionActions = transition
+        conditions = tuple(conditionActions)
+        # an empty condition list always passes, and a list of all-pureConst
+        # conditions has one answer for the FSM's lifetime: fold both to a
+        # bool here so dispatch never calls them
+        if not conditions:
+            conditions = True
+        elif all([getattr(condition, '_fsmPureConst', False) for condition in conditions]):
+            conditions = self.performConditionalActionList(conditions)
+        actions = tuple(transitionActions)
+        if nextStateName == _token_STATE_SAME:
+            return (conditions, fromIndex, actions, (), True)
+        nextIndex = self.stateIndex[nextStateName]
+        return (conditions, nextIndex, actions,
+                self.exitActions[fromIndex] + self.entryActions[nextIndex], False)
+
+
     def parseState(self, state):
         """ Parse the sequence that defines the state and return a sequence that
             FSM will use for processing
             the format of the state list is
             [ 'StateName', [ 'EntryAction', ...], ['ExitAction', ...], [Transitions, ...] ]
         """
-        eState =  Enumerate(('name', 'entryActions', 'exitActions', 'transitions'))
-        
-        # Get the name
-        stateName = state[eState.name]
+        stateName, entryActionNames, exitActionNames, transitions = state
+        stateName = intern(stateName)
+
         # convert to method list for entry actions
-        entryActions = MethodList(self, state[eState.entryActions])
-            
+        entryActions = makeMethodList(self, entryActionNames, self._availableMethods)
+
         # convert to method list for exit actions
-        exitActions = MethodList(self, state[eState.exitActions])
-            
-        transitions = state[eState.transitions]
+        exitActions = makeMethodList(self, exitActionNames, self._availableMethods)
+
         transitionDict = {}
         for transition in transitions:
             (k,v) = self.parseTransition(transition)
@@ -137,10 +314,16 @@ class FSM(object):
             else:
                 # otherwise just create a new list entry with the transition
                 transitionDict[k] = [v]
-                    
-        
+
+        # freeze the per-event lists; the runtime once extended these in
+        # place when merging STATE_ANY transitions, growing the parsed
+        # description on every event, and tuples keep that impossible
+        for k in transitionDict:
+            transitionDict[k] = tuple(transitionDict[k])
+
+
         key = stateName
-        value = [stateName, entryActions, exitActions, transitionDict]
+        value = (stateName, entryActions, exitActions, transitionDict)
         return (key, value)
             
             
@@ -149,19 +332,18 @@ class FSM(object):
             the format of the list is:
             [ 'eventName', ['condition0', ...], 'nextState', ['transtionAction', ...]]
         """
-        eTrans =  Enumerate(('name', 'conditions', 'nextState', 'transitionActions'))
-        eventName = transition[eTrans.name]
-            
-        conditionActions = MethodList(self,transition[eTrans.conditions])
-                
-        nextStateName = transition[eTrans.nextState]
+        eventName, conditionNames, nextStateName, transitionActionNames = transition
+        eventName = intern(eventName)
+
+        conditionActions = makeMethodList(self, conditionNames, self._availableMethods)
+
         if (nextStateName not in self.stateDict) and (nextStateName != _token_STATE_SAME):
-            raise ValueError, 'Target Next State "%s" not Found' % nextStateName
-                
-        transitionActions = MethodList(self, transition[eTrans.transitionActions])
-        
+            raise ValueError('Target Next State "%s" not Found' % nextStateName)
+
+        transitionActions = makeMethodList(self, transitionActionNames, self._availableMethods)
+
         key = eventName
-        value = [conditionActions, nextStateName, transitionActions]
+        value = (conditionActions, nextStateName, transitionActions)
         return (key, value)
         
         
@@ -170,118 +352,326 @@ class FSM(object):
         """ perform a list of actions without regard to their return value
             this is used for entry and exit actions
         """
-        if actionList:
-            [action() for action in actionList]
+        for action in actionList:
+            action()
         
     def performConditionalActionList(self, actionList):
         """ perform a list of actions. Checks the return value of each action and
             terminates if an action returns False
             this is used for condition and transition actions
         """
-        if actionList:
-            for action in actionList:
-                if not action():
-                    return False
+        for action in actionList:
+            if not action():
+                return False
         return True
         
     def Start(self):
-        eState =  Enumerate(('name', 'entryActions', 'exitActions', 'transitions'))
-        
-        state = self.stateDict[self.currentStateName]
-        if __debug__: self.dbgPrint('Starting FSM in state "%s"' % state[eState.name])
-        self.performActionList(state[eState.entryActions])
-        
+        if self.specializeDispatch and not self._debug:
+            self._generateDispatcher()
+        if self._debug: self.dbgPrint('Starting FSM in state "%s"' % self.currentStateName)
+        self.performActionList(self.entryActions[self.currentState])
+
+    def _generateDispatcher(self):
+        """ Partially evaluate the parsed description into straight-line
+            dispatch code and install it as this instance's OnEvent.
+            The description is frozen after parsing, so every dict lookup,
+            merge and loop the interpretive OnEvent performs per event can
+            be done once here instead
+        """
+        try:
+            source, namespace = self._emitDispatcherSource()
+            exec(source, namespace)
+            self._onEventId = namespace['_specializedOnEventId']
+        except Exception:
+            # codegen is purely an optimization; the interpretive OnEvent
+            # is always correct, so keep it on any failure
+            pass
+
+    def _emitDispatcherSource(self):
+        """ Emit the source of a dispatcher function specialized to the
+            flattened transition tables, with the condition and action
+            methods bound into its namespace
+        """
+        namespace = {'_fsm': self}
+        methodNames = {}
+
+        def ref(method):
+            # name each distinct bound method once in the namespace
+            name = methodNames.get(id(method))
+            if name is None:
+                name = '_m%d' % len(methodNames)
+                methodNames[id(method)] = name
+                namespace[name] = method
+            return name
+
+        lines = []
+        def emit(depth, text):
+            lines.append('    ' * depth + text)
+
+        def emitTransitionTail(depth, transition):
+            # the state-change half of performTransition: exit and entry
+            # actions only run when the state is explicitly changed
+            conditions, nextState, transitionActions, stateChangeActions, sameState = transition
+            if not sameState:
+                emit(depth, '_fsm.currentState = %d' % nextState)
+                # keep the interpretive dispatch's cached state entry valid
+                transName = '_t%d' % nextState
+                namespace[transName] = self.transByState[nextState]
+                emit(depth, '_fsm._curTrans = %s' % transName)
+                for action in stateChangeActions:
+                    emit(depth, '%s()' % ref(action))
+            emit(depth, 'return True')
+
+        emit(0, 'def _specializedOnEventId(eventId):')
+        emit(1, 'currentState = _fsm.currentState')
+        for index, stateName in enumerate(self.stateNames):
+            events = sorted([e for (i, e) in self.flatTrans if i == index])
+            if not events:
+                continue
+            emit(1, 'if currentState == %d:' % index)
+            catchTransition = self.catchTrans[index]
+            for event in events:
+                emit(2, 'if eventId == %d:' % self.eventIndex[event])
+                depth = 3
+                for transition in self.flatTrans[(index, event)]:
+                    conditions, nextState, transitionActions, stateChangeActions, sameState = transition
+                    if conditions is False:
+                        # folded to never-fires, emit nothing for it
+                        continue
+                    bodyDepth = depth
+                    if conditions is not True:
+                        emit(depth, 'if %s:' % ' and '.join(['%s()' % ref(c) for c in conditions]))
+                        bodyDepth = depth + 1
+                    if transitionActions:
+                        emit(bodyDepth, 'if %s:' % ' and '.join(['%s()' % ref(a) for a in transitionActions]))
+                        emitTransitionTail(bodyDepth + 1, transition)
+                        emit(bodyDepth, 'else:')
+                        if catchTransition is not None:
+                            for action in catchTransition[2]:
+                                emit(bodyDepth + 1, '%s()' % ref(action))
+                            emitTransitionTail(bodyDepth + 1, catchTransition)
+                        else:
+                            emit(bodyDepth + 1, 'return False')
+                    else:
+                        emitTransitionTail(bodyDepth, transition)
+                    if conditions is True:
+                        # an unconditional transition always fires, the rest
+                        # of the list is unreachable
+                        break
+                emit(depth, 'return False')
+            emit(2, 'return False')
+        emit(1, 'return False')
+        return '\n'.join(lines) + '\n', namespace
+
+    def _buildTypedTables(self):
+        """ Lower the flattened transition tables to integer numpy arrays for
+            the runEvents kernel. Conditions are evaluated once, here, so the
+            tables are only valid for FSMs whose conditions are pure; the
+            transition chosen per (state, event) pair is the first whose
+            conditions all hold, exactly as the interpretive dispatch would
+            pick it
+        """
+        # the integer event ids assigned at parse time index the matrices
+        eventIndex = self.eventIndex
+
+        numStates = len(self.stateNames)
+        numEvents = len(self.eventNames)
+        nextState = numpy.full((numStates, numEvents), -1, dtype=numpy.int32)
+        actionStart = numpy.zeros((numStates, numEvents), dtype=numpy.int32)
+        actionCount = numpy.zeros((numStates, numEvents), dtype=numpy.int32)
+
+        actionTable = []
+        actionIds = []
+        for (stateIndex, event), transitionList in self.flatTrans.items():
+            chosen = None
+            for transition in transitionList:
+                conditions = transition[0]
+                if not isinstance(conditions, tuple):
+                    conditionsMet = conditions
+                else:
+                    conditionsMet = self.performConditionalActionList(conditions)
+                if conditionsMet:
+                    chosen = transition
+                    break
+            if chosen is None:
+                continue
+            conditions, target, transitionActions, stateChangeActions, sameState = chosen
+            eventId = eventIndex[event]
+            nextState[stateIndex, eventId] = target
+            actions = transitionActions + stateChangeActions
+            actionStart[stateIndex, eventId] = len(actionIds)
+            actionCount[stateIndex, eventId] = len(actions)
+            for action in actions:
+                actionIds.append(len(actionTable))
+                actionTable.append(action)
+
+        maxActions = int(actionCount.max()) if actionCount.size else 0
+        self._typed = (eventIndex, nextState, actionStart, actionCount,
+                       numpy.array(actionIds, dtype=numpy.int32), actionTable, maxActions)
+
+    def runEvents(self, events):
+        """ Batch-process a sequence of events through the compiled kernel
+            and return the number of actions invoked. Requires numba and
+            numpy. The kernel replays the transition each (state, event)
+            pair selects when its conditions are first evaluated, so all
+            conditions must be pure and the transition actions must succeed
+            (CATCH transitions are not taken); use OnEvent when the FSM
+            relies on either
+        """
+        if njit is None:
+            raise RuntimeError('runEvents requires numba and numpy')
+        if self._typed is None:
+            self._buildTypedTables()
+        eventIndex, nextState, actionStart, actionCount, actionIds, actionTable, maxActions = self._typed
+
+        if not isinstance(events, numpy.ndarray):
+            # names no state handles are no-ops for OnEvent; skip them here
+            # rather than diverging with a KeyError
+            events = numpy.array([eventIndex[event] for event in events
+                                  if event in eventIndex], dtype=numpy.int32)
+        actionsOut = numpy.empty(len(events) * max(maxActions, 1), dtype=numpy.int32)
+
+        state, outCount = _runEventsKernel(events, self.currentState, nextState,
+                                           actionStart, actionCount, actionIds, actionsOut)
+        self.currentState = int(state)
+        # keep the interpretive dispatch's cached state entry valid
+        self._curTrans = self.transByState[self.currentState]
+        for actionId in actionsOut[:outCount]:
+            actionTable[actionId]()
+        return int(outCount)
+
     def OnEvent(self, event):
-        """ Process an event coming to the state Machine
+        """ Process an event coming to the state Machine by name
         """
-        eState =  Enumerate(('name', 'entryActions', 'exitActions', 'transitions'))
-        eTrans =  Enumerate(('conditions', 'nextState', 'transitionActions'))
-        
-        state = self.stateDict[self.currentStateName]
-        if __debug__: self.dbgPrint('Event "%s" seen in state "%s"' % (event, state[eState.name]))
-        
-        transitionDict = state[eState.transitions]
-        if event not in transitionDict:
-            if __debug__: self.dbgPrint('Event "%s" not handled in state "%s"' % (event, state[eState.name]))
-            transitionList = []
-        else:
-            transitionList = transitionDict[event]
-        
-        # get the transitions for STATE_ANY and put them at the end of the list
-        # does STATE_ANY exist
-        if  _token_STATE_ANY in self.stateDict:
-            # Get the state list
-            anyState = self.stateDict[_token_STATE_ANY]
-            # get the transaction dict
-            anyTransitionDict = anyState[eState.transitions]
-            # is the event handled
-            if event in anyTransitionDict:
-                # add the list of transactions that handle "event"
-                transitionList.extend(anyTransitionDict[event])
-        
-        # if there are no transition in this state or STATE_ANY then return
-        if not transitionList:
-            if __debug__: self.dbgPrint('Event "%s" not handled in state "%s or STATE_ANY"' % (event, state[eState.name]))
+        eventId = self.eventIndex.get(event)
+        if eventId is None:
+            if self._debug: self.dbgPrint('Event "%s" not handled by any state' % event)
             return False
-        
+        return self._onEventId(eventId)
+
+    def OnEventId(self, eventId, _isinstance=isinstance, _tuple=tuple):
+        """ Process an event coming to the state Machine by event id
+        """
+        currentState = self.currentState
+        if self._debug: self.dbgPrint('Event "%s" seen in state "%s"' % (self.eventNames[eventId], self.stateNames[currentState]))
+
+        # if a transition already fired for this (state, event) pair and the
+        # conditions were promised pure, replay it without re-evaluating them
+        if self.memoizeDispatch:
+            transition = self._dispatchCache.get((currentState, eventId))
+            if transition is not None:
+                if self._debug: self.dbgPrint('Event "%s" Handled in state "%s" (memoized)' % (self.eventNames[eventId], self.stateNames[currentState]))
+                return self.performTransition(transition)
+
+        # the state's own and STATE_ANY transitions were merged at parse time
+        # and _curTrans already points at the current state's event table, so
+        # a single list index answers whether the event is handled at all
+        transitionList = self._curTrans[eventId]
+        if transitionList is None:
+            if self._debug: self.dbgPrint('Event "%s" not handled in state "%s or STATE_ANY"' % (self.eventNames[eventId], self.stateNames[currentState]))
+            return False
+
         for transition in transitionList:
-            if self.performConditionalActionList(transition[eTrans.conditions]):
-                if __debug__: self.dbgPrint('Event "%s" Handled in state "%s"' % (event, state[eState.name]))
-                if not self.performConditionalActionList(transition[eTrans.transitionActions]):
-                    ## do the catch actions
-                    if __debug__: self.dbgPrint('Event "%s" in state "%s" - Transition Actions returned False' % (event, state[eState.name]))
-                    if _token_EVENT_CATCH in transitionDict:
-                        # make the transition the catch transition
-                        # perform the actions associated with the catch transition
-                        # and fall through to the state transition logic below
-                        if __debug__: self.dbgPrint('Performing "CATCH" transition')
-                        transition = transitionDict[_token_EVENT_CATCH][0]
-                        self.performActionList(transition[eTrans.transitionActions])
-                    else:
-                        ## stay in the same state and continue processing
-                        if __debug__: self.dbgPrint('No "CATCH" transition - remaining in state "%s"' % self.currentStateName)
-                        return False
-                
-                # get next state
-                nextStateName = transition[eTrans.nextState]
-                
-                # only perform exit and entry actions if state explicitly is changed
-                # even if is is to the same state but using the state name
-                if nextStateName != _token_STATE_SAME:
-                    self.currentStateName = transition[eTrans.nextState]
-                    if __debug__: self.dbgPrint('transitioning to state "%s"' % self.currentStateName)
-                    self.performActionList(state[eState.exitActions])
-                    newstate = self.stateDict[self.currentStateName]
-                    self.performActionList(newstate[eState.entryActions])
-                    return True
-                else:
-                    if __debug__: self.dbgPrint('remaining in state "%s"' % self.currentStateName)
-                    return True
+            conditions = transition[0]
+            # folded condition lists are already a bool (_isinstance/_tuple
+            # are bound as defaults to skip the global lookups per event)
+            if not _isinstance(conditions, _tuple):
+                conditionsMet = conditions
             else:
-                if __debug__: self.dbgPrint('Event "%s" in state "%s - Conditions not met"' % (event, state[eState.name]))
-                
-        if __debug__: self.dbgPrint('Event "%s" - no conditions met in state "%s"' % (event, state[eState.name]))
+                conditionsMet = self.performConditionalActionList(conditions)
+            if conditionsMet:
+                if self._debug: self.dbgPrint('Event "%s" Handled in state "%s"' % (self.eventNames[eventId], self.stateNames[currentState]))
+                if self.memoizeDispatch:
+                    self._dispatchCache[(currentState, eventId)] = transition
+                return self.performTransition(transition)
+            else:
+                if self._debug: self.dbgPrint('Event "%s" in state "%s - Conditions not met"' % (self.eventNames[eventId], self.stateNames[currentState]))
+
+        if self._debug: self.dbgPrint('Event "%s" - no conditions met in state "%s"' % (self.eventNames[eventId], self.stateNames[currentState]))
         return False
+
+    def performTransition(self, transition):
+        """ Run a transition whose conditions have already been satisfied:
+            the transition actions, the CATCH handling if they fail, and the
+            exit/entry actions of a state change
+        """
+        currentState = self.currentState
+        conditions, nextState, transitionActions, stateChangeActions, sameState = transition
+        if not self.performConditionalActionList(transitionActions):
+            ## do the catch actions
+            if self._debug: self.dbgPrint('Transition Actions returned False in state "%s"' % self.stateNames[currentState])
+            catchTransition = self.catchTrans[currentState]
+            if catchTransition is not None:
+                # make the transition the catch transition
+                # perform the actions associated with the catch transition
+                # and fall through to the state transition logic below
+                if self._debug: self.dbgPrint('Performing "CATCH" transition')
+                conditions, nextState, transitionActions, stateChangeActions, sameState = catchTransition
+                self.performActionList(transitionActions)
+            else:
+                ## stay in the same state and continue processing
+                if self._debug: self.dbgPrint('No "CATCH" transition - remaining in state "%s"' % self.currentStateName)
+                return False
+
+        # only perform exit and entry actions if state explicitly is changed
+        # even if is is to the same state but using the state name
+        if not sameState:
+            self.currentState = nextState
+            self._curTrans = self.transByState[nextState]
+            if self._debug: self.dbgPrint('transitioning to state "%s"' % self.currentStateName)
+            self.performActionList(stateChangeActions)
+            return True
+        else:
+            if self._debug: self.dbgPrint('remaining in state "%s"' % self.currentStateName)
+            return True
                 
-class FSMThreaded(FSM):        
+class FSMThreaded(FSM):
+    __slots__ = ('running', 'paused', 'threadDone', 'myThread',
+                 '_ring', '_ringMask', '_head', '_tail',
+                 '_freeSlots', '_queuedEvents')
+
+    ## size of the event ring buffer, must be a power of two
+    RING_SIZE = 128
+
     def __init__(self, FSMDescription):
         FSM.__init__(self, FSMDescription)
         self.dbgLabel = 'FSMThreaded'
         self.running = False
         self.myThread = Thread(target=self.threadMethod)
-        self.myQueue = Queue(100)
+        # single-producer/single-consumer ring: SendEvent only ever writes
+        # _head, threadMethod only ever writes _tail, so neither index needs
+        # a lock; the semaphores count free slots and queued events
+        self._ring = [None] * self.RING_SIZE
+        self._ringMask = self.RING_SIZE - 1
+        self._head = 0
+        self._tail = 0
+        self._freeSlots = Semaphore(self.RING_SIZE)
+        self._queuedEvents = Semaphore(0)
         self.paused = False
-    
+
     def threadMethod(self):
         self.threadDone = False
         while not self.threadDone:
-            event = self.myQueue.get(True)
-            if event == _token_EVENT_EXIT:
-                self.running = False
-                return
-            self.OnEvent(event)
-            
-        
+            # block for the first event of a burst, then drain the rest of
+            # the burst with non-blocking acquires so bursty producers cost
+            # one wait per batch instead of one per event
+            self._queuedEvents.acquire()
+            while True:
+                tail = self._tail
+                eventId = self._ring[tail & self._ringMask]
+                self._tail = tail + 1
+                self._freeSlots.release()
+                if eventId >= 0:
+                    self._onEventId(eventId)
+                elif eventId == _EXIT_EVENT_ID:
+                    self.running = False
+                    return
+                elif self._debug:
+                    self.dbgPrint('Unknown event dequeued - not handled by any state')
+                if not self._queuedEvents.acquire(False):
+                    break
+
+
     def Start(self):
         if self.running:
             raise RuntimeError
@@ -291,7 +681,7 @@ class FSMThreaded(FSM):
         FSM.Start(self)
         
     def isAlive(self):
-        return self.myThread.isAlive()
+        return self.myThread.is_alive()
     
     def Pause(self):
         self.paused = True
@@ -301,7 +691,17 @@ class FSMThreaded(FSM):
         
     def SendEvent(self, event):
         if not self.paused and self.running:
-            self.myQueue.put(event)
+            # map the name to its id on the producer side, once per event
+            if event == _token_EVENT_EXIT:
+                eventId = _EXIT_EVENT_ID
+            else:
+                eventId = self.eventIndex.get(event, _UNKNOWN_EVENT_ID)
+            # blocks while the ring is full, as Queue.put did
+            self._freeSlots.acquire()
+            head = self._head
+            self._ring[head & self._ringMask] = eventId
+            self._head = head + 1
+            self._queuedEvents.release()
         
     def SendExitEvent(self):
         self.SendEvent(_token_EVENT_EXIT)